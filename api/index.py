@@ -2,7 +2,10 @@ from flask import Flask, request, jsonify
 from flask_cors import CORS
 import os
 import json
+import math
 import time
+import threading
+import uuid
 from datetime import datetime
 try:
     from dqn_core import dqn
@@ -28,17 +31,44 @@ class UltimaCore:
         self.tools = {}
         self.upgrades = []
         self.token_address = "9bzJn2jHQPCGsYKapFvytJQcbaz5FN2TtNB43jb1pump"
+        self.cursor = 0
+        self.boot_id = uuid.uuid4().hex
+        self.changed = threading.Condition()
         
     def log_activity(self, activity_type, data):
-        log_entry = {
-            "timestamp": datetime.now().isoformat(),
-            "type": activity_type,
-            "data": data,
-            "version": self.version
-        }
-        self.memory.append(log_entry)
+        with self.changed:
+            self.cursor += 1
+            log_entry = {
+                "cursor": self.cursor,
+                "timestamp": datetime.now().isoformat(),
+                "type": activity_type,
+                "data": data,
+                "version": self.version
+            }
+            self.memory.append(log_entry)
+            self.changed.notify_all()
         return log_entry
     
+    def oldest_cursor(self):
+        """Cursor of the oldest entry still held in memory"""
+        return self.memory[0]["cursor"] if self.memory else self.cursor + 1
+    
+    def cursor_expired(self, cursor):
+        """Whether entries after `cursor` have already been dropped from memory"""
+        return cursor < self.oldest_cursor() - 1
+    
+    def events_since(self, cursor, limit=100):
+        """Return up to `limit` log entries with a cursor greater than `cursor`"""
+        # Cursors are consecutive, so memory may be trimmed from the front without breaking lookups
+        start = max(0, min(cursor, self.cursor) - self.oldest_cursor() + 1)
+        return self.memory[start:start + limit]
+    
+    def wait_for_events(self, cursor, timeout, limit=100):
+        """Block until entries newer than `cursor` exist or `timeout` elapses"""
+        with self.changed:
+            self.changed.wait_for(lambda: self.cursor > cursor, timeout)
+            return self.events_since(cursor, limit)
+    
     def update_system_prompt(self, new_prompt):
         old_prompt = self.system_prompt
         self.system_prompt = new_prompt
@@ -59,6 +89,11 @@ class UltimaCore:
 # Global Ultima instance
 ultima = UltimaCore()
 
+# Long-poll window for /api/events. The default stays under Vercel's function time
+# limit; there, writes on other instances never wake this one, so it is also the
+# worst-case delay before the sidebar catches up.
+EVENTS_MAX_TIMEOUT = float(os.environ.get("ULTIMA_EVENTS_TIMEOUT", 8))
+
 @app.route('/api/chat', methods=['POST'])
 def chat():
     try:
@@ -145,7 +180,8 @@ def status():
             "memory_entries": len(ultima.memory),
             "tools_created": len(ultima.tools),
             "upgrades": len(ultima.upgrades),
-            "token_address": ultima.token_address
+            "token_address": ultima.token_address,
+            "cursor": ultima.cursor
         })
     except Exception as e:
         print(f"Status error: {e}")
@@ -154,14 +190,53 @@ def status():
 @app.route('/api/logs')
 def logs():
     try:
+        with ultima.changed:
+            entries = ultima.memory[-20:]
+            cursor = ultima.cursor
         return jsonify({
-            "logs": ultima.memory[-20:],
+            "boot": ultima.boot_id,
+            "cursor": cursor,
+            "logs": entries,
             "total": len(ultima.memory)
         })
     except Exception as e:
         print(f"Logs error: {e}")
         return jsonify({"error": f"Logs failed: {str(e)}"}), 500
 
+@app.route('/api/events')
+def events():
+    try:
+        cursor = request.args.get('cursor', 0, type=int)
+        timeout = request.args.get('timeout', EVENTS_MAX_TIMEOUT, type=float)
+        # nan would slip through min/max and make Condition.wait_for block forever
+        if not math.isfinite(timeout):
+            timeout = EVENTS_MAX_TIMEOUT
+        timeout = max(0.0, min(timeout, EVENTS_MAX_TIMEOUT))
+        
+        # A cursor from another process (e.g. before a restart), or one older than the entries
+        # still held, can't be resumed; the client must reload
+        stale = request.args.get('boot', ultima.boot_id) != ultima.boot_id
+        if stale or cursor > ultima.cursor or ultima.cursor_expired(cursor):
+            return jsonify({
+                "reset": True,
+                "events": [],
+                "boot": ultima.boot_id,
+                "cursor": ultima.cursor,
+                "version": ultima.version
+            })
+        
+        entries = ultima.wait_for_events(cursor, timeout)
+        return jsonify({
+            "reset": False,
+            "events": entries,
+            "boot": ultima.boot_id,
+            "cursor": entries[-1]["cursor"] if entries else cursor,
+            "version": ultima.version
+        })
+    except Exception as e:
+        print(f"Events error: {e}")
+        return jsonify({"error": f"Events failed: {str(e)}"}), 500
+
 @app.route('/api/tools')
 def tools():
     try:
@@ -1,10 +1,15 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, abort
 from flask_cors import CORS
 import os
 import json
 import time
+import hmac
+import math
+import threading
+import uuid
 from datetime import datetime
 from dqn_core import dqn
+from profiler import profiler
 
 app = Flask(__name__)
 CORS(app)
@@ -18,17 +23,44 @@ class UltimaCore:
         self.tools = {}
         self.upgrades = []
         self.token_address = "9bzJn2jHQPCGsYKapFvytJQcbaz5FN2TtNB43jb1pump"
+        self.cursor = 0
+        self.boot_id = uuid.uuid4().hex
+        self.changed = threading.Condition()
         
     def log_activity(self, activity_type, data):
-        log_entry = {
-            "timestamp": datetime.now().isoformat(),
-            "type": activity_type,
-            "data": data,
-            "version": self.version
-        }
-        self.memory.append(log_entry)
+        with self.changed:
+            self.cursor += 1
+            log_entry = {
+                "cursor": self.cursor,
+                "timestamp": datetime.now().isoformat(),
+                "type": activity_type,
+                "data": data,
+                "version": self.version
+            }
+            self.memory.append(log_entry)
+            self.changed.notify_all()
         return log_entry
     
+    def oldest_cursor(self):
+        """Cursor of the oldest entry still held in memory"""
+        return self.memory[0]["cursor"] if self.memory else self.cursor + 1
+    
+    def cursor_expired(self, cursor):
+        """Whether entries after `cursor` have already been dropped from memory"""
+        return cursor < self.oldest_cursor() - 1
+    
+    def events_since(self, cursor, limit=100):
+        """Return up to `limit` log entries with a cursor greater than `cursor`"""
+        # Cursors are consecutive, so memory may be trimmed from the front without breaking lookups
+        start = max(0, min(cursor, self.cursor) - self.oldest_cursor() + 1)
+        return self.memory[start:start + limit]
+    
+    def wait_for_events(self, cursor, timeout, limit=100):
+        """Block until entries newer than `cursor` exist or `timeout` elapses"""
+        with self.changed:
+            self.changed.wait_for(lambda: self.cursor > cursor, timeout)
+            return self.events_since(cursor, limit)
+    
     def update_system_prompt(self, new_prompt):
         old_prompt = self.system_prompt
         self.system_prompt = new_prompt
@@ -58,6 +90,19 @@ class UltimaCore:
 # Global Ultima instance
 ultima = UltimaCore()
 
+@app.before_request
+def begin_request_profile():
+    profiler.requests.begin_request()
+
+@app.teardown_request
+def end_request_profile(exc):
+    profiler.requests.end_request()
+
+# Long-poll window for /api/events. The default stays under Vercel's function time
+# limit; there, writes on other instances never wake this one, so it is also the
+# worst-case delay before the sidebar catches up.
+EVENTS_MAX_TIMEOUT = float(os.environ.get("ULTIMA_EVENTS_TIMEOUT", 8))
+
 @app.route('/api/chat', methods=['POST'])
 def chat():
     data = request.json
@@ -119,16 +164,52 @@ def status():
         "memory_entries": len(ultima.memory),
         "tools_created": len(ultima.tools),
         "upgrades": len(ultima.upgrades),
-        "token_address": ultima.token_address
+        "token_address": ultima.token_address,
+        "cursor": ultima.cursor
     })
 
 @app.route('/api/logs')
 def logs():
+    with ultima.changed:
+        entries = ultima.memory[-20:]  # Last 20 entries
+        cursor = ultima.cursor
     return jsonify({
-        "logs": ultima.memory[-20:],  # Last 20 entries
+        "boot": ultima.boot_id,
+        "cursor": cursor,
+        "logs": entries,
         "total": len(ultima.memory)
     })
 
+@app.route('/api/events')
+def events():
+    cursor = request.args.get('cursor', 0, type=int)
+    timeout = request.args.get('timeout', EVENTS_MAX_TIMEOUT, type=float)
+    # nan would slip through min/max and make Condition.wait_for block forever
+    if not math.isfinite(timeout):
+        timeout = EVENTS_MAX_TIMEOUT
+    timeout = max(0.0, min(timeout, EVENTS_MAX_TIMEOUT))
+    
+    # A cursor from another process (e.g. before a restart), or one older than the entries
+    # still held, can't be resumed; the client must reload
+    stale = request.args.get('boot', ultima.boot_id) != ultima.boot_id
+    if stale or cursor > ultima.cursor or ultima.cursor_expired(cursor):
+        return jsonify({
+            "reset": True,
+            "events": [],
+            "boot": ultima.boot_id,
+            "cursor": ultima.cursor,
+            "version": ultima.version
+        })
+    
+    entries = ultima.wait_for_events(cursor, timeout)
+    return jsonify({
+        "reset": False,
+        "events": entries,
+        "boot": ultima.boot_id,
+        "cursor": entries[-1]["cursor"] if entries else cursor,
+        "version": ultima.version
+    })
+
 @app.route('/api/tools')
 def tools():
     return jsonify({
@@ -136,5 +217,42 @@ def tools():
         "count": len(ultima.tools)
     })
 
+@app.route('/api/debug/profile', methods=['POST'])
+def debug_profile():
+    # Hidden unless ULTIMA_PROFILE_TOKEN is set on the server
+    token = profiler.token
+    if not token:
+        abort(404)
+    # Compare bytes: compare_digest raises TypeError on non-ASCII str
+    if not hmac.compare_digest(request.headers.get('X-Profile-Token', '').encode(), token.encode()):
+        return jsonify({"error": "Invalid profile token"}), 403
+    
+    mode = request.args.get('mode', 'sample')
+    if mode not in ('sample', 'cprofile'):
+        return jsonify({"error": "Mode must be 'sample' or 'cprofile'"}), 400
+    
+    try:
+        duration = float(request.args.get('seconds', 5.0))
+        interval = float(request.args.get('interval', 0.005))
+        limit = int(request.args.get('top', 20))
+    except ValueError:
+        return jsonify({"error": "seconds, interval and top must be numbers"}), 400
+    if not all(math.isfinite(value) and value > 0 for value in (duration, interval, limit)):
+        return jsonify({"error": "seconds, interval and top must be finite and positive"}), 400
+    
+    result = profiler.profile(
+        mode=mode,
+        duration=duration,
+        interval=interval,
+        limit=limit,
+        include_idle=request.args.get('idle', '') == '1'
+    )
+    if result is None:
+        return jsonify({"error": "A profile is already running"}), 409
+    
+    if request.args.get('format') == 'collapsed' and mode == 'sample':
+        return result["collapsed"], 200, {"Content-Type": "text/plain; charset=utf-8"}
+    return jsonify(result)
+
 if __name__ == '__main__':
     app.run(debug=True, port=5000)
\ No newline at end of file
@@ -0,0 +1,167 @@
+import cProfile
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+
+# Leaf frames in these files are threads parked on a lock or socket, not doing work
+IDLE_FILES = ("threading.py", "selectors.py", "socketserver.py", "queue.py")
+
+class SamplingProfiler:
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self.elapsed = 0.0
+
+    def frame_label(self, frame):
+        """Render a frame as file:function for collapsed stacks"""
+        code = frame.f_code
+        return f"{os.path.basename(code.co_filename)}:{code.co_name}"
+
+    def run(self, duration, exclude=(), include_idle=False):
+        """Sample the stacks of every other thread for `duration` seconds"""
+        exclude = set(exclude) | {threading.get_ident()}
+        started = time.perf_counter()
+        deadline = started + duration
+
+        while time.perf_counter() < deadline:
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id in exclude:
+                    continue
+                if not include_idle and os.path.basename(frame.f_code.co_filename) in IDLE_FILES:
+                    continue
+
+                stack = []
+                while frame is not None:
+                    stack.append(self.frame_label(frame))
+                    frame = frame.f_back
+                self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+            time.sleep(self.interval)
+
+        self.elapsed = time.perf_counter() - started
+        return self
+
+    def sample_ms(self):
+        """Measured wall time per sample; stack walks and sleep overshoot make it exceed `interval`"""
+        if not self.samples:
+            return 0.0
+        return self.elapsed * 1000 / self.samples
+
+    def collapsed(self):
+        """Stacks in the folded format read by flamegraph.pl and speedscope"""
+        return "\n".join(f"{stack} {count}" for stack, count in self.stacks.most_common())
+
+    def top(self, limit=20):
+        """Functions ranked by own samples, with inclusive samples alongside"""
+        sample_ms = self.sample_ms()
+        own = Counter()
+        total = Counter()
+        for stack, count in self.stacks.items():
+            frames = stack.split(";")
+            own[frames[-1]] += count
+            for label in set(frames):
+                total[label] += count
+
+        return [{
+            "function": label,
+            "self_samples": count,
+            "total_samples": total[label],
+            "self_ms": round(count * sample_ms, 2),
+            "total_ms": round(total[label] * sample_ms, 2)
+        } for label, count in own.most_common(limit)]
+
+class RequestProfiler:
+    """Per-request cProfile collection, switched on only while a session is open"""
+    def __init__(self):
+        self.session = None
+        self.local = threading.local()
+        self.lock = threading.Lock()
+
+    def begin_request(self):
+        session = self.session
+        if session is None:
+            return
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Another profiler already owns this interpreter (Python 3.12+)
+            return
+        self.local.current = (session, profile)
+
+    def end_request(self):
+        current = getattr(self.local, "current", None)
+        if current is None:
+            return
+        self.local.current = None
+        session, profile = current
+        profile.disable()
+        with self.lock:
+            session.append(profile)
+
+    def run(self, duration, limit=20):
+        """Profile every request that completes within `duration` seconds"""
+        session = []
+        self.session = session
+        time.sleep(duration)
+        self.session = None
+
+        with self.lock:
+            profiles = list(session)
+        if not profiles:
+            return {"requests": 0, "top": []}
+
+        stats = pstats.Stats(*profiles)
+        ranked = sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)
+        return {
+            "requests": len(profiles),
+            "top": [{
+                "function": f"{os.path.basename(filename)}:{name}",
+                "line": line,
+                "calls": ncalls,
+                "self_ms": round(tottime * 1000, 3),
+                "total_ms": round(cumtime * 1000, 3)
+            } for (filename, line, name), (_, ncalls, tottime, cumtime, _) in ranked[:limit]]
+        }
+
+class DebugProfiler:
+    def __init__(self, max_duration=60):
+        self.max_duration = max_duration
+        self.requests = RequestProfiler()
+        self.busy = threading.Lock()
+
+    @property
+    def token(self):
+        return os.environ.get("ULTIMA_PROFILE_TOKEN", "")
+
+    def profile(self, mode="sample", duration=5.0, interval=0.005, limit=20, include_idle=False):
+        """Run one time-bounded profile; returns None if another is in progress"""
+        if not self.busy.acquire(blocking=False):
+            return None
+        try:
+            duration = max(0.0, min(duration, self.max_duration))
+            started = time.time()
+
+            if mode == "cprofile":
+                result = self.requests.run(duration, limit)
+            else:
+                sampler = SamplingProfiler(max(interval, 0.001)).run(duration, include_idle=include_idle)
+                result = {
+                    "samples": sampler.samples,
+                    "interval": sampler.interval,
+                    "sample_ms": round(sampler.sample_ms(), 3),
+                    "collapsed": sampler.collapsed(),
+                    "top": sampler.top(limit)
+                }
+
+            result.update({"mode": mode, "duration": duration, "started": started})
+            return result
+        finally:
+            self.busy.release()
+
+# Global profiler instance
+profiler = DebugProfiler()
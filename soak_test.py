@@ -0,0 +1,424 @@
+"""Soak test for the Ultima API.
+
+Replays a message corpus against the app at a fixed rate for a long time and
+tracks memory, latency and throughput, failing on slow degradation.
+
+    python soak_test.py --duration 2h --rate 20
+    python soak_test.py --corpus traffic.jsonl --url http://localhost:5000 --pid 1234
+
+A corpus is JSONL of {"method", "path", "json"} requests; a plain-text line is
+sent as a chat message. Without --url the app runs in-process on Flask's test
+client, which also enables tracemalloc and object counts.
+"""
+import argparse
+import gc
+import json
+import os
+import random
+import sys
+import threading
+import time
+import tracemalloc
+import urllib.error
+import urllib.request
+from collections import Counter, defaultdict
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+# Default growth limits per hour; UltimaCore.memory gains entries on every request
+DEFAULT_RSS_SLOPE = 50.0
+DEFAULT_OBJECT_SLOPES = {"ultima_memory": 1000.0}
+
+SYNTHETIC_WORDS = ["ultima", "reason", "token", "upgrade", "memory", "network", "learn", "signal", "agent", "prompt"]
+
+def parse_duration(text):
+    """Parse '90', '30s', '15m' or '2h' into seconds"""
+    units = {"s": 1, "m": 60, "h": 3600}
+    if text[-1] in units:
+        return float(text[:-1]) * units[text[-1]]
+    return float(text)
+
+def load_corpus(path):
+    corpus = []
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            if line.startswith("{"):
+                entry = json.loads(line)
+                corpus.append({
+                    "method": entry.get("method", "POST" if "json" in entry else "GET"),
+                    "path": entry["path"],
+                    "json": entry.get("json")
+                })
+            else:
+                corpus.append({"method": "POST", "path": "/api/chat", "json": {"message": line}})
+    return corpus
+
+def synthetic_request(rng):
+    """A request mix weighted like a chat session with a sidebar open"""
+    roll = rng.random()
+    if roll < 0.7:
+        words = rng.choices(SYNTHETIC_WORDS, k=rng.randint(1, 12))
+        return {"method": "POST", "path": "/api/chat", "json": {"message": " ".join(words) + f" {rng.random():.6f}"}}
+    if roll < 0.8:
+        return {"method": "GET", "path": "/api/status", "json": None}
+    if roll < 0.9:
+        return {"method": "GET", "path": "/api/logs", "json": None}
+    if roll < 0.97:
+        return {"method": "GET", "path": "/api/events?cursor=0&timeout=0", "json": None}
+    return {"method": "POST", "path": "/api/create-tool", "json": {"name": f"tool_{rng.randint(0, 50)}", "code": "pass"}}
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+def median(values):
+    values = sorted(values)
+    middle = len(values) // 2
+    if len(values) % 2:
+        return values[middle]
+    return (values[middle - 1] + values[middle]) / 2
+
+def slope_per_hour(points):
+    """Least-squares slope of (seconds, value) points, per hour"""
+    if len(points) < 2:
+        return 0.0
+    n = len(points)
+    mean_t = sum(t for t, _ in points) / n
+    mean_v = sum(v for _, v in points) / n
+    var_t = sum((t - mean_t) ** 2 for t, _ in points)
+    if var_t == 0:
+        return 0.0
+    cov = sum((t - mean_t) * (v - mean_v) for t, v in points)
+    return cov / var_t * 3600
+
+def rss_mb(pid):
+    if pid is None:
+        return None
+    if psutil is not None:
+        try:
+            return psutil.Process(pid).memory_info().rss / 1e6
+        except psutil.Error:
+            # The server died or restarted; keep soaking so the report still gets written
+            return None
+    try:
+        with open(f"/proc/{pid}/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1e6
+    except OSError:
+        return None
+
+class InProcessTarget:
+    def __init__(self, torch=False):
+        from app import app
+        self.client = app.test_client()
+        self.torch_dqn = None
+        if torch:
+            # The app never loads the PyTorch DQN itself, so feed it chat traffic directly
+            import torch_dqn
+            self.torch_dqn = torch_dqn
+
+    def send(self, req):
+        if req["method"] == "POST":
+            res = self.client.post(req["path"], json=req["json"])
+        else:
+            res = self.client.get(req["path"])
+        if self.torch_dqn is not None and req["path"] == "/api/chat" and res.status_code == 200:
+            self.torch_dqn.ultima_dqn.learn_from_text(req["json"]["message"], res.get_json()["response"])
+        return res.status_code
+
+    def object_counts(self):
+        """Sizes of the structures known to grow, plus the GC's object total"""
+        import app
+        counts = {
+            "gc_objects": len(gc.get_objects()),
+            "ultima_memory": len(app.ultima.memory),
+            "ultima_tools": len(app.ultima.tools),
+            "dqn_q_table": len(getattr(app.dqn, "q_table", {})),
+            "dqn_memory": len(getattr(app.dqn, "memory", ()))
+        }
+        if self.torch_dqn is not None:
+            counts["torch_buffer"] = len(self.torch_dqn.ultima_dqn.buffer.memory)
+        return counts
+
+class HttpTarget:
+    def __init__(self, url):
+        self.url = url.rstrip("/")
+
+    def send(self, req):
+        data = json.dumps(req["json"]).encode() if req["json"] is not None else None
+        request = urllib.request.Request(
+            self.url + req["path"],
+            data=data,
+            method=req["method"],
+            headers={"Content-Type": "application/json"}
+        )
+        try:
+            with urllib.request.urlopen(request, timeout=30) as res:
+                res.read()
+                return res.status
+        except urllib.error.HTTPError as e:
+            return e.code
+
+    def object_counts(self):
+        return {}
+
+class SoakTest:
+    def __init__(self, target, corpus, args):
+        self.target = target
+        self.corpus = corpus
+        self.args = args
+        self.rng = random.Random(args.seed)
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = Counter()
+        self.completed = 0
+        self.failed = 0
+        self.sent = 0
+        self.samples = []
+        self.stop = threading.Event()
+        self.position = 0
+
+    def next_request(self):
+        with self.lock:
+            if not self.corpus:
+                return synthetic_request(self.rng)
+            req = self.corpus[self.position % len(self.corpus)]
+            self.position += 1
+            return req
+
+    def worker(self, rate):
+        interval = 1.0 / rate
+        next_at = time.perf_counter()
+        while not self.stop.is_set():
+            req = self.next_request()
+            endpoint = req["path"].split("?")[0]
+
+            started = time.perf_counter()
+            try:
+                status = self.target.send(req)
+            except Exception as e:
+                status = type(e).__name__
+            elapsed = time.perf_counter() - started
+
+            # Only successful responses count as throughput; a dead server must not look healthy
+            with self.lock:
+                self.latencies[endpoint].append(elapsed * 1000)
+                self.sent += 1
+                if status == 200:
+                    self.completed += 1
+                else:
+                    self.failed += 1
+                    self.errors[f"{endpoint} {status}"] += 1
+
+            # Fixed schedule, so a slow response eats into the next gap instead of shifting it
+            next_at += interval
+            delay = next_at - time.perf_counter()
+            if delay > 0:
+                self.stop.wait(delay)
+            else:
+                next_at = time.perf_counter()
+
+    def take_sample(self, started, window_started, baseline_snapshot):
+        now = time.perf_counter()
+        with self.lock:
+            latencies, self.latencies = self.latencies, defaultdict(list)
+            completed, self.completed = self.completed, 0
+            failed, self.failed = self.failed, 0
+
+        sample = {
+            "elapsed": round(now - started, 1),
+            "window": round(now - window_started, 1),
+            "throughput": round(completed / max(now - window_started, 1e-9), 2),
+            "errors": failed,
+            "latency_ms": {
+                endpoint: {
+                    "count": len(values),
+                    "p50": round(percentile(values, 0.50), 2),
+                    "p95": round(percentile(values, 0.95), 2),
+                    "p99": round(percentile(values, 0.99), 2)
+                } for endpoint, values in latencies.items()
+            },
+            "rss_mb": rss_mb(self.args.pid),
+            "objects": self.target.object_counts()
+        }
+
+        if tracemalloc.is_tracing():
+            snapshot = tracemalloc.take_snapshot()
+            sample["heap_mb"] = round(tracemalloc.get_traced_memory()[0] / 1e6, 3)
+            sample["top_allocators"] = [{
+                "location": str(stat.traceback[0]),
+                "size_diff_kb": round(stat.size_diff / 1000, 1),
+                "count_diff": stat.count_diff
+            } for stat in snapshot.compare_to(baseline_snapshot, "lineno")[:self.args.top]]
+
+        self.samples.append(sample)
+        return sample
+
+    def run(self):
+        args = self.args
+        in_process = isinstance(self.target, InProcessTarget)
+        if in_process:
+            tracemalloc.start()
+            baseline_snapshot = tracemalloc.take_snapshot()
+        else:
+            baseline_snapshot = None
+
+        workers = [
+            threading.Thread(target=self.worker, args=(args.rate / args.workers,), daemon=True)
+            for _ in range(args.workers)
+        ]
+        started = time.perf_counter()
+        for thread in workers:
+            thread.start()
+
+        deadline = started + args.duration
+        window_started = started
+        try:
+            while time.perf_counter() < deadline:
+                self.stop.wait(min(args.sample_interval, max(deadline - time.perf_counter(), 0)))
+                sample = self.take_sample(started, window_started, baseline_snapshot)
+                window_started = time.perf_counter()
+                print(json.dumps({
+                    "elapsed": sample["elapsed"],
+                    "throughput": sample["throughput"],
+                    "errors": sample["errors"],
+                    "rss_mb": sample["rss_mb"],
+                    "heap_mb": sample.get("heap_mb"),
+                    **sample["objects"]
+                }), flush=True)
+        except KeyboardInterrupt:
+            print("Interrupted, evaluating samples collected so far", file=sys.stderr)
+        finally:
+            self.stop.set()
+            for thread in workers:
+                thread.join(timeout=5)
+            if in_process:
+                tracemalloc.stop()
+
+        return self.evaluate()
+
+    def evaluate(self):
+        """Check growth slopes and throughput against the configured limits"""
+        args = self.args
+        steady = [s for s in self.samples if s["elapsed"] > args.warmup] or self.samples
+        failures = []
+
+        def check_slope(name, points, limit):
+            slope = slope_per_hour(points)
+            if limit is not None and slope > limit:
+                failures.append(f"{name} grows {slope:.2f}/h, limit {limit}/h")
+            return round(slope, 3)
+
+        slopes = {
+            "rss_mb": check_slope(
+                "RSS (MB)",
+                [(s["elapsed"], s["rss_mb"]) for s in steady if s["rss_mb"] is not None],
+                args.max_rss_slope
+            ),
+            "heap_mb": check_slope(
+                "Traced heap (MB)",
+                [(s["elapsed"], s["heap_mb"]) for s in steady if "heap_mb" in s],
+                args.max_heap_slope
+            )
+        }
+        for name in steady[0]["objects"] if steady else ():
+            slopes[name] = check_slope(
+                name,
+                [(s["elapsed"], s["objects"][name]) for s in steady],
+                args.max_object_slope.get(name)
+            )
+
+        # The last window is cut short at the deadline, so it says little about throughput
+        windows = [s for s in steady if s["window"] >= args.sample_interval / 2]
+        if len(windows) >= 2:
+            third = max(len(windows) // 3, 1)
+            baseline = median([s["throughput"] for s in windows[:third]])
+            final = median([s["throughput"] for s in windows[-third:]])
+            if baseline > 0 and final < baseline * (1 - args.max_throughput_drop):
+                failures.append(f"Throughput fell from {baseline}/s to {final}/s")
+
+        with self.lock:
+            errors = dict(self.errors)
+            sent = self.sent
+            error_rate = sum(errors.values()) / sent if sent else 1.0
+        if not sent:
+            failures.append("No requests were sent")
+        elif error_rate > args.max_error_rate:
+            failures.append(f"Error rate {error_rate:.2%} over {sent} requests, limit {args.max_error_rate:.2%}")
+
+        return {
+            "passed": not failures,
+            "failures": failures,
+            "slopes_per_hour": slopes,
+            "errors": errors,
+            "error_rate": round(error_rate, 4),
+            "samples": self.samples
+        }
+
+def parse_object_slopes(values):
+    limits = dict(DEFAULT_OBJECT_SLOPES)
+    for value in values:
+        name, _, limit = value.partition("=")
+        limits[name] = float(limit)
+    return limits
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay traffic against the Ultima API and track degradation")
+    parser.add_argument("--corpus", help="JSONL requests or plain-text chat messages; synthetic traffic if omitted")
+    parser.add_argument("--url", help="Base URL of a running server; uses the in-process test client if omitted")
+    parser.add_argument("--torch", action="store_true",
+                        help="Also train torch_dqn.ultima_dqn on chat traffic and track its replay buffer (in-process only)")
+    parser.add_argument("--pid", type=int, help="Server process whose RSS is sampled with --url; defaults to this process otherwise")
+    parser.add_argument("--duration", type=parse_duration, default=parse_duration("10m"), help="e.g. 600, 30m, 4h")
+    parser.add_argument("--rate", type=float, default=20.0, help="Target requests per second")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--sample-interval", type=parse_duration, default=30.0)
+    parser.add_argument("--warmup", type=parse_duration, default=60.0, help="Samples before this are left out of checks")
+    parser.add_argument("--top", type=int, default=10, help="tracemalloc allocators reported per sample")
+    parser.add_argument("--max-rss-slope", type=float, default=DEFAULT_RSS_SLOPE,
+                        help="Fail if RSS grows faster than this many MB/hour")
+    parser.add_argument("--max-heap-slope", type=float, help="Fail if the traced heap grows faster than this many MB/hour")
+    parser.add_argument("--max-object-slope", action="append", default=[], metavar="NAME=PER_HOUR",
+                        help="Fail if an object count grows faster; defaults to ultima_memory=1000")
+    parser.add_argument("--max-throughput-drop", type=float, default=0.2,
+                        help="Fail if median throughput over the last third of samples is this fraction below the first third")
+    parser.add_argument("--max-error-rate", type=float, default=0.01,
+                        help="Fail if more than this fraction of requests error or return non-200")
+    parser.add_argument("--report", help="Write the full JSON report here")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+    args.max_object_slope = parse_object_slopes(args.max_object_slope)
+    if args.torch and args.url:
+        parser.error("--torch needs the in-process target; it can't reach a remote server's DQN")
+    if args.pid is None:
+        if args.url:
+            print("Warning: --url without --pid, so server RSS is not sampled or checked", file=sys.stderr)
+        else:
+            args.pid = os.getpid()
+
+    corpus = load_corpus(args.corpus) if args.corpus else []
+    target = HttpTarget(args.url) if args.url else InProcessTarget(torch=args.torch)
+    report = SoakTest(target, corpus, args).run()
+
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(report, f, indent=2)
+
+    print(json.dumps({
+        "passed": report["passed"],
+        "failures": report["failures"],
+        "slopes_per_hour": report["slopes_per_hour"],
+        "errors": report["errors"],
+        "error_rate": report["error_rate"]
+    }, indent=2))
+    return 0 if report["passed"] else 1
+
+if __name__ == "__main__":
+    sys.exit(main())